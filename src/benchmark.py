@@ -0,0 +1,542 @@
+"""
+Benchmark and regression suite for AVLTree and AssociativeArray.
+Compares them with dict, bisect on lists and heapq baselines
+across sizes and key distributions.
+
+Usage (from the repository root):
+    python -m src.benchmark run -o new.json
+    python -m src.benchmark compare old.json new.json
+
+Every case is repeated until it has run for --min-time seconds (as timeit autorange does)
+and the fastest run is kept, in --repeat rounds over all cases of a size;
+compare flags a case only when its slowdown is above the spread of these rounds.
+Cases whose setup and runs take more than --budget seconds are skipped for bigger sizes.
+The default run (sizes 10^3..10^7, budget 60 s) takes about an hour on one core
+and needs a few GB of RAM for AVLTree at 10^7 (about 130 bytes per node).
+Use --sizes to keep it short, e.g. --sizes 1000 10000 100000 takes a few minutes.
+"""
+
+import argparse
+import gc
+import heapq
+import json
+import math
+import platform
+import random
+import statistics
+import sys
+import time
+from bisect import bisect_left, insort
+from datetime import datetime, timezone
+from typing import Callable
+
+from src.modules.associative_array.associative_array import AssociativeArray
+from src.modules.avl_tree.avl_tree import AVLTree
+
+DEFAULT_SIZES = [10 ** 3, 10 ** 4, 10 ** 5, 10 ** 6, 10 ** 7]
+DISTRIBUTIONS = ["sorted", "random", "adversarial"]
+TABLE_SIZE = 10     # default AssociativeArray size
+MAX_WALL_FACTOR = 5     # a case stops after min_time * MAX_WALL_FACTOR seconds including resets
+
+
+def make_keys(distribution: str, n: int, seed: int = 0) -> list[int]:
+    """
+    Generates n unique even int keys, so key + 1 is never a key (see make_misses).
+    Adversarial keys are multiples of TABLE_SIZE (one hash chain)
+    going in zigzag from both ends (rotations on both sides of the tree)
+    """
+    if distribution == "sorted":
+        return list(range(0, 2 * n, 2))
+    if distribution == "random":
+        keys = list(range(0, 2 * n, 2))
+        random.Random(seed).shuffle(keys)
+        return keys
+    if distribution == "adversarial":
+        keys = []
+        lo, hi = 0, n - 1
+        while lo <= hi:
+            keys.append(lo * TABLE_SIZE)
+            if lo != hi:
+                keys.append(hi * TABLE_SIZE)
+            lo += 1
+            hi -= 1
+        return keys
+    raise ValueError(f"Unknown distribution {distribution}")
+
+
+def make_misses(keys: list[int]) -> list[int]:
+    """Returns keys that are absent, lying between the present ones"""
+    return [key + 1 for key in keys]
+
+
+def make_chain_misses(keys: list[int]) -> list[int]:
+    """
+    Returns keys that are absent but hash into the same chains as keys,
+    so an unsuccessful lookup scans the whole chain
+    """
+    shift = TABLE_SIZE * (max(keys) // TABLE_SIZE + 1)
+    return [key + shift for key in keys]
+
+
+def _measure(setup: Callable[[], object], run: Callable[[object], object],
+             reset: Callable[[object], object] | None, min_time: float) -> tuple[float, int, float]:
+    """
+    Runs case until runs take min_time in total, with gc disabled while timing.
+    Before every next run reset (untimed) returns a fresh state,
+    None means run does not change the state.
+    Returns seconds of the fastest run (the least disturbed one), number of runs
+    and seconds of setup
+    """
+    setup_start = time.perf_counter()
+    state = setup()
+    setup_seconds = time.perf_counter() - setup_start
+    runs = 0
+    timed = 0.0
+    best = float("inf")
+    wall_start = time.perf_counter()
+    while True:
+        gc.disable()
+        try:
+            start = time.perf_counter()
+            run(state)
+            elapsed = time.perf_counter() - start
+        finally:
+            gc.enable()
+        timed += elapsed
+        best = min(best, elapsed)
+        runs += 1
+        if timed >= min_time or time.perf_counter() - wall_start >= min_time * MAX_WALL_FACTOR:
+            return best, runs, setup_seconds
+        if reset is not None:
+            state = reset(state)
+
+
+def _shared(build: Callable[[], object]) -> Callable[[], object]:
+    """Builds a structure once for all read-only cases of a size and distribution"""
+    cache = []
+
+    def get():
+        if not cache:
+            cache.append(build())
+        return cache[0]
+    return get
+
+
+def _join(t1: AVLTree, t2: AVLTree) -> AVLTree:
+    """Merges back trees returned by split"""
+    if len(t2) == 0:
+        return t1
+    t2.merge(t1)
+    return t2
+
+
+# Every case is (setup, run, number of operations in run, reset), built from the keys.
+# Read-only cases share one structure built once per size and distribution.
+# Remove cases go in reverse insertion order: the removed key is the last one of its chain,
+# with keys removed in insertion order it would always be the first
+
+def _avl_cases(keys: list) -> dict:
+    ordered = sorted(keys)
+    misses = make_misses(keys)
+    half = len(ordered) // 2
+
+    def build():
+        # inserted in distribution order, so the tree has the shape real insertions give
+        tree = AVLTree()
+        for key in keys:
+            tree.insert(key)
+        return tree
+
+    # box[0] is the shared tree, box[1] (if any) is the pair of trees
+    # split and merge cases took it apart into; they are joined back untimed,
+    # so they go after the other read-only cases, which see the inserted shape
+    box = []
+
+    def shared():
+        if not box:
+            box.append(build())
+        if len(box) > 1:
+            box[0] = _join(*box.pop())
+        return box[0]
+
+    def insert(tree):
+        for key in keys:
+            tree.insert(key)
+
+    def find(tree):
+        for key in keys:
+            key in tree
+
+    def find_miss(tree):
+        for key in misses:
+            key in tree
+
+    def remove(tree):
+        for key in reversed(keys):
+            tree.remove(key)
+
+    def iterate(tree):
+        for _ in tree:
+            pass
+
+    def whole(_=None):
+        shared()
+        return box
+
+    def split(box):
+        box.append(box[0].split(ordered[half]))
+
+    def halves(_=None):
+        tree = shared()
+        box.append(tree.split(ordered[half - 1]) if half else (AVLTree(), tree))
+        return box
+
+    def merge(box):
+        small, big = box.pop()
+        big.merge(small)
+        box[0] = big
+
+    return {
+        "insert": (AVLTree, insert, len(keys), lambda _: AVLTree()),
+        "from_sorted": (lambda: ordered, AVLTree.from_sorted, len(keys), None),
+        "remove": (build, remove, len(keys), lambda _: build()),
+        "find": (shared, find, len(keys), None),
+        "find_miss": (shared, find_miss, len(keys), None),
+        "iterate": (shared, iterate, len(keys), None),
+        "bfs": (shared, lambda tree: tree.breadth_first_search(), len(keys), None),
+        "split": (whole, split, 1, whole),
+        "merge": (halves, merge, 1, halves),
+    }
+
+
+def _associative_array_cases(keys: list) -> dict:
+    misses = make_chain_misses(keys)
+
+    def build():
+        array = AssociativeArray(TABLE_SIZE)
+        for key in keys:
+            array.insert(key, key)
+        return array
+    shared = _shared(build)
+
+    def insert(array):
+        for key in keys:
+            array.insert(key, key)
+
+    def find(array):
+        for key in keys:
+            array.find(key)
+
+    def find_miss(array):
+        for key in misses:
+            array.find(key)
+
+    def remove(array):
+        for key in reversed(keys):
+            array.remove(key)
+
+    return {
+        "insert": (lambda: AssociativeArray(TABLE_SIZE), insert, len(keys), lambda _: AssociativeArray(TABLE_SIZE)),
+        "remove": (build, remove, len(keys), lambda _: build()),
+        "find": (shared, find, len(keys), None),
+        "find_miss": (shared, find_miss, len(keys), None),
+    }
+
+
+def _dict_cases(keys: list) -> dict:
+    misses = make_misses(keys)
+
+    def insert(d):
+        for key in keys:
+            d[key] = key
+
+    def find(d):
+        for key in keys:
+            d.get(key)
+
+    def find_miss(d):
+        for key in misses:
+            d.get(key)
+
+    def remove(d):
+        for key in reversed(keys):
+            del d[key]
+
+    def iterate(d):
+        for _ in d:
+            pass
+
+    shared = _shared(lambda: dict.fromkeys(keys))
+    return {
+        "insert": (dict, insert, len(keys), lambda _: {}),
+        "remove": (lambda: dict.fromkeys(keys), remove, len(keys), lambda _: dict.fromkeys(keys)),
+        "find": (shared, find, len(keys), None),
+        "find_miss": (shared, find_miss, len(keys), None),
+        "iterate": (shared, iterate, len(keys), None),
+    }
+
+
+def _bisect_cases(keys: list) -> dict:
+    ordered = sorted(keys)
+    misses = make_misses(keys)
+    half = len(ordered) // 2
+
+    def insert(lst):
+        for key in keys:
+            insort(lst, key)
+
+    def find(lst):
+        for key in keys:
+            i = bisect_left(lst, key)
+            i < len(lst) and lst[i] == key
+
+    def find_miss(lst):
+        for key in misses:
+            i = bisect_left(lst, key)
+            i < len(lst) and lst[i] == key
+
+    def remove(lst):
+        for key in reversed(keys):
+            del lst[bisect_left(lst, key)]
+
+    def iterate(lst):
+        for _ in lst:
+            pass
+
+    def split(lst):
+        i = bisect_left(lst, ordered[half])
+        return lst[:i], lst[i:]
+
+    return {
+        "insert": (list, insert, len(keys), lambda _: []),
+        "remove": (ordered.copy, remove, len(keys), lambda _: ordered.copy()),
+        "find": (lambda: ordered, find, len(keys), None),
+        "find_miss": (lambda: ordered, find_miss, len(keys), None),
+        "iterate": (lambda: ordered, iterate, len(keys), None),
+        "split": (lambda: ordered, split, 1, None),
+        "merge": (lambda: (ordered[:half], ordered[half:]), lambda lists: lists[0] + lists[1], 1, None),
+    }
+
+
+def _heapq_cases(keys: list) -> dict:
+    def insert(heap):
+        for key in keys:
+            heapq.heappush(heap, key)
+
+    def build():
+        heap = keys.copy()
+        heapq.heapify(heap)
+        return heap
+
+    def pop_min(heap):
+        while heap:
+            heapq.heappop(heap)
+
+    # heapq cannot remove an arbitrary key, so there is no remove case
+    return {
+        "insert": (list, insert, len(keys), lambda _: []),
+        "pop_min": (build, pop_min, len(keys), lambda _: build()),
+    }
+
+
+STRUCTURES = {
+    "AVLTree": _avl_cases,
+    "AssociativeArray": _associative_array_cases,
+    "dict": _dict_cases,
+    "bisect": _bisect_cases,
+    "heapq": _heapq_cases,
+}
+
+
+def _predict(history: list[tuple[int, float]], size: int) -> float:
+    """
+    Predicts seconds at size from (size, seconds) of the last sizes of a case.
+    Growth is fitted as size ** k by the last two sizes, at least linear
+    """
+    last_size, last_seconds = history[-1]
+    power = 1.0
+    if len(history) > 1:
+        prev_size, prev_seconds = history[-2]
+        if prev_seconds > 0 and last_seconds > 0:
+            power = max(power, math.log(last_seconds / prev_seconds) / math.log(last_size / prev_size))
+    return last_seconds * (size / last_size) ** power
+
+
+def run(sizes: list[int], structures: list[str], repeat: int, min_time: float, budget: float, seed: int) -> dict:
+    """
+    Runs every case of every structure for each size and distribution.
+    A size is measured in repeat rounds over all its cases, so the measurements of a case
+    are spread over the whole size and a slow spell of the machine does not hit all of them.
+    Keeps every measurement, a case gets no more rounds after budget seconds.
+    A case is skipped for bigger sizes when its last size took more than budget seconds
+    with setup included, or when setup and a run predicted for the next size would.
+    Skipped cases are saved as results with "skipped": true
+    """
+    if any(size < 1 for size in sizes):
+        raise ValueError("Sizes must be positive")
+    results = []
+    history = {}   # name of case -> [(size, seconds of the fastest run, seconds of setup, seconds in total)]
+    skipped = set()
+    for size in sorted(set(sizes)):
+        measured = {}   # name of case -> (result, ops, seconds of setup, seconds in total)
+        for round_number in range(repeat):
+            for distribution in DISTRIBUTIONS:
+                keys = make_keys(distribution, size, seed)
+                for structure in structures:
+                    for operation, (setup, case, ops, reset) in STRUCTURES[structure](keys).items():
+                        name = f"{structure}.{operation}.{distribution}"
+                        case_key = {"structure": structure, "operation": operation,
+                                    "distribution": distribution, "size": size}
+                        if round_number == 0 and name not in skipped and name in history:
+                            runs_history = [(n, seconds) for n, seconds, _, _ in history[name]]
+                            setup_history = [(n, seconds) for n, _, seconds, _ in history[name]]
+                            predicted = _predict(runs_history, size) + _predict(setup_history, size)
+                            if history[name][-1][3] > budget or predicted > budget:
+                                print(f"{name} would exceed budget, skipping sizes from {size}")
+                                skipped.add(name)
+                        if round_number == 0 and name in skipped:
+                            # kept in results, so compare sees a case that got too slow to run
+                            results.append({**case_key, "skipped": True})
+                        if name in skipped or (name in measured and measured[name][3] > budget):
+                            continue
+
+                        start = time.perf_counter()
+                        seconds, runs, setup_seconds = _measure(setup, case, reset, min_time)
+                        spent = time.perf_counter() - start
+                        if name not in measured:
+                            measured[name] = ({**case_key, "times": [], "runs": runs}, ops, setup_seconds, 0.0)
+                        result, ops, setup_seconds, total = measured[name]
+                        result["times"].append(seconds)
+                        measured[name] = (result, ops, setup_seconds, total + spent)
+
+        for name, (result, ops, setup_seconds, total) in measured.items():
+            times = result["times"]
+            seconds = min(times)
+            history.setdefault(name, []).append((result["size"], seconds, setup_seconds, total))
+            result.update({
+                "seconds": seconds,
+                "median": statistics.median(times),
+                "max": max(times),
+                "ns_per_op": seconds / ops * 1e9,
+            })
+            results.append(result)
+            print(f"{name:<40} n={result['size']:<10} {seconds:12.6f} s {seconds / ops * 1e9:14.1f} ns/op"
+                  f"  x{result['runs']}  spread {max(times) / seconds - 1:6.1%}")
+    return {
+        "meta": {
+            "python": platform.python_version(),
+            "implementation": platform.python_implementation(),
+            "machine": platform.machine(),
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "repeat": repeat,
+            "min_time": min_time,
+            "seed": seed,
+        },
+        "results": results,
+    }
+
+
+def _timed_total(result: dict) -> float:
+    """Returns approximate seconds a case was timed for, over all its runs"""
+    return result["seconds"] * result.get("runs", 1)
+
+
+def _median(result: dict) -> float:
+    """Returns median seconds of a case, the fastest run for results saved without it"""
+    return result.get("median", result["seconds"])
+
+
+def _spread(result: dict) -> float:
+    """Returns relative spread of the measurements of a case, 0 for results saved without them"""
+    return result.get("max", result["seconds"]) / result["seconds"] - 1
+
+
+def compare(old: dict, new: dict, threshold: float, min_seconds: float) -> list[dict]:
+    """
+    Matches results of two runs and returns the ones that became slower than old beyond noise:
+    all new measurements are slower than all old ones and the median grew
+    by more than threshold plus the relative spread of the measurements.
+    Cases measured in old but skipped or missing in new are regressions too.
+    Cases timed for less than min_seconds over all their runs are never flagged
+    """
+    def key(result):
+        return result["structure"], result["operation"], result["distribution"], result["size"]
+
+    new_results = {key(result): result for result in new["results"]}
+    regressions = []
+    for base in old["results"]:
+        if base.get("skipped"):
+            continue
+        name = ".".join(map(str, key(base)))
+        result = new_results.get(key(base))
+        if result is None or result.get("skipped"):
+            mark = "missing" if result is None else "skipped"
+            regressions.append({**base, "old_seconds": base["seconds"], mark: True})
+            print(f"{name:<50} {base['seconds']:12.6f} -> {mark:>12}    REGRESSION")
+            continue
+        if base["seconds"] == 0:
+            continue
+        ratio = _median(result) / _median(base)
+        tolerance = threshold + max(_spread(base), _spread(result))
+        mark = ""
+        if min(_timed_total(base), _timed_total(result)) < min_seconds:
+            mark = "too fast to compare"
+        elif result["seconds"] > base.get("max", base["seconds"]) and ratio > 1 + tolerance:
+            mark = "REGRESSION"
+            regressions.append({**result, "old_seconds": base["seconds"], "ratio": ratio})
+        elif base["seconds"] > result.get("max", result["seconds"]) and ratio < 1 - tolerance:
+            mark = "improvement"
+        print(f"{name:<50} {base['seconds']:12.6f} -> {result['seconds']:12.6f} s  x{ratio:6.2f} {mark}")
+    return regressions
+
+
+def _positive_int(value: str) -> int:
+    size = int(value)
+    if size < 1:
+        raise argparse.ArgumentTypeError(f"size must be >= 1, got {size}")
+    return size
+
+
+def main(argv: list[str] | None = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    run_parser = commands.add_parser("run", help="run benchmarks and save results as JSON")
+    run_parser.add_argument("-o", "--output", default="bench_output.json")
+    run_parser.add_argument("--sizes", type=_positive_int, nargs="+", default=DEFAULT_SIZES)
+    run_parser.add_argument("--structures", nargs="+", choices=list(STRUCTURES), default=list(STRUCTURES))
+    run_parser.add_argument("--repeat", type=int, default=5)
+    run_parser.add_argument("--min-time", type=float, default=0.2,
+                            help="seconds every measurement runs a case for at least")
+    run_parser.add_argument("--budget", type=float, default=60.0,
+                            help="seconds per case (setup included) after which bigger sizes are skipped")
+    run_parser.add_argument("--seed", type=int, default=0)
+
+    compare_parser = commands.add_parser("compare", help="compare two runs and flag regressions")
+    compare_parser.add_argument("old")
+    compare_parser.add_argument("new")
+    compare_parser.add_argument("--threshold", type=float, default=0.1,
+                                help="relative slowdown of the median, above the spread, reported as a regression")
+    compare_parser.add_argument("--min-seconds", type=float, default=1e-4,
+                                help="cases timed for less than this in total are never flagged")
+
+    args = parser.parse_args(argv)
+
+    if args.command == "run":
+        results = run(args.sizes, args.structures, args.repeat, args.min_time, args.budget, args.seed)
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+        print(f"Results saved to {args.output}")
+        return 0
+
+    with open(args.old) as f:
+        old = json.load(f)
+    with open(args.new) as f:
+        new = json.load(f)
+    regressions = compare(old, new, args.threshold, args.min_seconds)
+    print(f"{len(regressions)} regression(s) found")
+    return 1 if regressions else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
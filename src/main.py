@@ -4,6 +4,7 @@ from src.modules.associative_array.associative_array import AssociativeArray
 import random
 
 from src.modules.avl_tree.avl_tree import AVLTree
+from src.benchmark import compare
 if __name__ == "__main__":
     for test in range(100):
         print("Running delete test #", test)
@@ -19,6 +20,19 @@ if __name__ == "__main__":
             assert(a.in_order() == ans)
             assert(len(a) == len(ans))
 
+    for test in range(100):
+        print("Running random delete test #", test)
+        a = AVLTree()
+        ans = list(range(test))
+        random.shuffle(ans)
+        for i in ans:
+            a.insert(i)
+        for i in list(ans):
+            a.remove(i)
+            ans.remove(i)
+            assert(a.check())
+            assert(a.in_order() == sorted(ans))
+
     test = 0
     for size in range(100):
         for p in range(size):
@@ -46,17 +60,74 @@ if __name__ == "__main__":
             l_b = b.in_order()
             try:
                 a.merge(b)
-            except:
-                if len(a) == 0 or len(b) == 0:
-                    print("A/B empty, OK")
-                elif a.height() < b.height():
-                    print("Failure if height, OK")
-                elif a.min() <= b.max():
-                    print("Failure in min/max, OK")
-                else:
-                    print("Strange thing occurred")
+            except RuntimeError:
+                # merge of any heights must succeed, only empty or overlapping trees are rejected
+                assert (len(a) == 0 or len(b) == 0 or a.min() <= b.max())
             else:
                 assert (a.check())
                 assert (l_b + l_a == a.in_order())
             test += 1
 
+    test = 0
+    for a_i in range(1, 60):
+        for b_i in range(a_i, 60):
+            print(f"Running lower merge test #{test}")
+            a = AVLTree.from_sorted([b_i + i for i in range(a_i)])
+            b = AVLTree.from_sorted(list(range(b_i)))
+            ans = b.in_order() + a.in_order()
+            a.merge(b)
+            assert (a.check())
+            assert (a.in_order() == ans)
+            test += 1
+
+    for test in range(300):
+        print(f"Running random split test #{test}")
+        a = AVLTree()
+        ans = [random.randrange(test + 1) for _ in range(test)]
+        for i in ans:
+            a.insert(i)
+        p = random.randrange(test + 1)
+        t1, t2 = a.split(p)
+        assert (t1.check())
+        assert (t2.check())
+        assert (t1.in_order() == sorted(i for i in ans if i <= p))
+        assert (t2.in_order() == sorted(i for i in ans if i > p))
+
+    test = 0
+    for size in range(0, 3000, 300):
+        for batch in (0, 3, size // 10, size):
+            print(f"Running update test #{test}")
+            values = [random.randrange(size // 2 + 1) for _ in range(size)]
+            a = AVLTree.from_sorted(sorted(values))
+            assert (a.check())
+            inserted = [random.randrange(size + 1) for _ in range(batch)]
+            removed = values[:batch // 2] + [-1]
+            a.update(inserted, removed)
+            ans = values[batch // 2:] + inserted
+            assert (a.check())
+            assert (a.in_order() == sorted(ans))
+            test += 1
+
+    print("Running compare tests")
+    case = {"structure": "AVLTree", "operation": "insert", "distribution": "sorted", "size": 1000}
+    old = {"results": [{**case, "seconds": 0.010, "median": 0.011, "max": 0.012, "runs": 20}]}
+    # same code, new run slower but inside the spread of the old one
+    noisy = {"results": [{**case, "seconds": 0.0115, "median": 0.0125, "max": 0.014, "runs": 20}]}
+    assert (compare(old, noisy, 0.1, 1e-4) == [])
+    assert (compare(old, old, 0.1, 1e-4) == [])
+    slower = {"results": [{**case, "seconds": 0.020, "median": 0.021, "max": 0.022, "runs": 10}]}
+    regressions = compare(old, slower, 0.1, 1e-4)
+    assert (len(regressions) == 1 and regressions[0]["ratio"] > 1.5)
+    assert (compare(slower, old, 0.1, 1e-4) == [])
+    # below the noise floor even a double slowdown is not flagged
+    fast = {"results": [{**case, "seconds": 1e-6, "median": 1e-6, "max": 1e-6, "runs": 1}]}
+    fast_slower = {"results": [{**case, "seconds": 2e-6, "median": 2e-6, "max": 2e-6, "runs": 1}]}
+    assert (compare(fast, fast_slower, 0.1, 1e-4) == [])
+    assert (len(compare(fast, fast_slower, 0.1, 1e-7)) == 1)
+    # a case measured in old but missing or skipped in new is a regression
+    regressions = compare(old, {"results": []}, 0.1, 1e-4)
+    assert (len(regressions) == 1 and regressions[0]["missing"])
+    regressions = compare(old, {"results": [{**case, "skipped": True}]}, 0.1, 1e-4)
+    assert (len(regressions) == 1 and regressions[0]["skipped"])
+    # a case skipped in old and measured in new is not
+    assert (compare({"results": [{**case, "skipped": True}]}, old, 0.1, 1e-4) == [])
@@ -1,8 +1,13 @@
-from typing import Any
-from collections import deque
+import gc
+from bisect import bisect_right
+from typing import Any, Iterable
+from collections import Counter, deque
 
 from src.modules.avl_tree.avl_tree_iterator import AVLTreeIterator
 
+# batch updates smaller than len(tree) / REBUILD_RATIO go one value at a time
+REBUILD_RATIO = 16
+
 class AVLTree:
     """
     Self-balancing binary search tree.
@@ -268,6 +273,12 @@ class AVLTree:
             if min_node.left is not None:
                 min_node.left.parent = min_node
             min_node.parent = node.parent
+            # rotations of min_node relink the parent, so it must point to min_node
+            if node.parent is not None:
+                if node.parent.left == node:
+                    node.parent.left = min_node
+                else:
+                    node.parent.right = min_node
             return self._balance(min_node)
         return self._balance(node)
 
@@ -338,49 +349,189 @@ class AVLTree:
         self._in_order(self._root, result)
         return result
 
+    def _join(self, left_root: Node | None, middle: Node, right_root: Node | None) -> Node:
+        """
+        Joins left_root tree, middle node and right_root tree
+        such as all values of left_root <= middle.val <= all values of right_root.
+        Goes down the higher tree to a subtree as high as the lower one,
+        replaces it with middle and balances up.
+        Time complexity: O(|height(left_root) - height(right_root)| + 1)
+        """
+        parent = None
+        if self._height(left_root) > self._height(right_root) + 1:
+            # goes down the right side of left_root
+            node = left_root
+            while self._height(node) > self._height(right_root) + 1:
+                parent = node
+                node = node.right
+            parent.right = middle
+            left_root = node
+        elif self._height(right_root) > self._height(left_root) + 1:
+            # goes down the left side of right_root
+            node = right_root
+            while self._height(node) > self._height(left_root) + 1:
+                parent = node
+                node = node.left
+            parent.left = middle
+            right_root = node
+
+        middle.left = left_root
+        if left_root is not None:
+            left_root.parent = middle
+        middle.right = right_root
+        if right_root is not None:
+            right_root.parent = middle
+        middle.parent = parent
+
+        # balancing
+        return self._balance_up(middle)
+
     def _merge(self, bigger_root: "AVLTree.Node", smaller_root: "AVLTree.Node") -> "AVLTree.Node":
         """
         Merges smaller_root tree into bigger_root tree.
+        Max of smaller_root joins them
         """
         # gets max element from tree as root for a temp tree
         temp_tree_root = self._get_max(smaller_root)
         smaller_root = self._remove_max(smaller_root)
-
-        # finds a node from self to place the tree after
-        insert_after_node = bigger_root
-        while insert_after_node.left and self._height(insert_after_node) > self._height(smaller_root):
-            insert_after_node = insert_after_node.left
-
-        # places originally tree
-        temp_tree_root.left = smaller_root
-        if smaller_root:
-            smaller_root.parent = temp_tree_root
-
-        # inserts temp tree between found node and an old tree
-        temp_tree_root.right = insert_after_node.left
-        if insert_after_node.left:
-            insert_after_node.left.parent = temp_tree_root
-
-        insert_after_node.left = temp_tree_root
-        temp_tree_root.parent = insert_after_node
-
-        # balancing
-        return self._balance_up(temp_tree_root)
+        if smaller_root is not None:
+            smaller_root.parent = None
+        return self._join(smaller_root, temp_tree_root, bigger_root)
 
     def merge(self, tree: "AVLTree"):
         """
         Merges two trees - self and tree - into self if
-        self.min() > tree.max() and self.height() >= tree.height()
+        self.min() > tree.max(). Heights of the trees may be any
         """
         if self._root is None:
             raise RuntimeError("Empty tree")
         if tree._root is None:
             return
-        if self.min() <= tree.max() or self.height()< tree.height():
+        if self.min() <= tree.max():
             raise RuntimeError("Impossible to merge trees")
 
         self._root = self._merge(self._root, tree._root)
 
+    def _build_sorted(self, values: list, lo: int, hi: int) -> Node | None:
+        """
+        Builds perfectly balanced subtree from values[lo:hi] recursively.
+        Values must be sorted. Returns root of the subtree.
+        Heights and sizes are set inline, it is the hot path of from_sorted
+        """
+        if lo >= hi:
+            return None
+        mid = (lo + hi) // 2
+        root = AVLTree.Node(values[mid])
+        left = self._build_sorted(values, lo, mid)
+        right = self._build_sorted(values, mid + 1, hi)
+        root.left = left
+        root.right = right
+        height = size = 0
+        if left is not None:
+            left.parent = root
+            height = left.height
+            size = left.subtree_size
+        if right is not None:
+            right.parent = root
+            height = max(height, right.height)
+            size += right.subtree_size
+        root.height = height + 1
+        root.subtree_size = size + 1
+        return root
+
+    def _rebuild(self, values: list) -> None:
+        """
+        Replaces all nodes of self with a tree built from sorted values.
+        Garbage collector is paused: the build only allocates nodes,
+        and full collections over millions of new nodes double its time
+        """
+        gc_enabled = gc.isenabled()
+        gc.disable()
+        try:
+            self._root = self._build_sorted(values, 0, len(values))
+        finally:
+            if gc_enabled:
+                gc.enable()
+
+    @classmethod
+    def from_sorted(cls, values: list) -> "AVLTree":
+        """
+        Builds a tree from sorted values without rotations.
+        Time complexity: O(n)
+        """
+        tree = cls()
+        tree._rebuild(values)
+        return tree
+
+    @staticmethod
+    def _cut(values: list, pivots: list) -> list[list]:
+        """Cuts sorted values into parts lying between neighbouring pivots (as split does)"""
+        bounds = [0] + [bisect_right(values, pivot) for pivot in pivots] + [len(values)]
+        return [values[bounds[i]:bounds[i + 1]] for i in range(len(bounds) - 1)]
+
+    def _apply_batch(self, insert: list, remove: list) -> None:
+        """
+        Inserts and removes sorted batches of values.
+        Small batch goes one by one, big one rebuilds the tree from sorted values
+        """
+        if (len(insert) + len(remove)) * REBUILD_RATIO < len(self):
+            for val in insert:
+                self.insert(val)
+            for val in remove:
+                if self._root is not None:
+                    self.remove(val)
+            return
+
+        values = self.in_order() + insert
+        values.sort()
+        if remove:
+            to_remove = Counter(remove)
+            kept = []
+            for val in values:
+                if to_remove[val] > 0:
+                    to_remove[val] -= 1
+                else:
+                    kept.append(val)
+            values = kept
+        self._rebuild(values)
+
+    def update(self, insert: Iterable[Any] = (), remove: Iterable[Any] = (), partitions: int = 16) -> None:
+        """
+        Inserts all values of insert, then removes one occurrence of every value of remove.
+        Splits the tree into partitions by quantiles of the batch,
+        untouched partitions keep their nodes, touched ones get their part of the batch,
+        then partitions are merged back.
+        Time complexity: O(k log n) for a batch of k values,
+        at most O(n) when the batch is comparable with the tree
+        """
+        insert = sorted(insert)
+        remove = sorted(remove)
+        batch = sorted(insert + remove) if remove else insert
+        if len(batch) * REBUILD_RATIO < len(self) or not batch:
+            self._apply_batch(insert, remove)
+            return
+
+        pivots = sorted(set(batch[i * len(batch) // partitions] for i in range(1, partitions)))
+
+        # split(x) leaves values <= x in the first tree
+        pieces = []
+        rest = self
+        for pivot in pivots:
+            piece, rest = rest.split(pivot)
+            pieces.append(piece)
+        pieces.append(rest)
+
+        for piece, piece_insert, piece_remove in zip(pieces, self._cut(insert, pivots), self._cut(remove, pivots)):
+            if piece_insert or piece_remove:
+                piece._apply_batch(piece_insert, piece_remove)
+
+        result = AVLTree()
+        for piece in reversed(pieces):
+            if result._root is None:
+                result = piece
+            else:
+                result.merge(piece)
+        self._root = result._root
 
     def naive_split(self, key):
         """Naive implementation of splitting a tree into two. Need to replace"""
@@ -394,121 +545,38 @@ class AVLTree:
                 t2.insert(i)
         return t1, t2
 
+    def _split(self, node: Node | None, x: Any) -> tuple[Node | None, Node | None]:
+        """
+        Splits subtree node recursively into roots of two trees
+        with values <= x and > x.
+        Detaches node and joins it with the half of its subtree on the same side
+        """
+        if node is None:
+            return None, None
+        left, right = node.left, node.right
+        node.left = node.right = node.parent = None
+        if left is not None:
+            left.parent = None
+        if right is not None:
+            right.parent = None
+
+        if node.val <= x:
+            less, greater = self._split(right, x)
+            return self._join(left, node, less), greater
+        less, greater = self._split(left, x)
+        return less, self._join(greater, node, right)
+
     def split(self, x: Any) -> tuple["AVLTree", "AVLTree"]:
         """
         Splits self in two AVLTrees t1 and t2 such as
         t1.max() <= x and t2.min() > x.
         Recursively goes down at self,
-        merging half of each subtree with t1 or t2
-        Time complexity: O(log^2 n)
+        joining half of each subtree with t1 or t2
+        Time complexity: O(log n)
         """
         t1 = AVLTree() # all values <= x
         t2 = AVLTree() # all values > x
-
-        def _detach(node):
-            """Auxiliary func that erase all links to node"""
-            if node.right is not None:
-                node.right.parent = None
-                node.right = None
-            if node.left is not None:
-                node.left.parent = None
-                node.left = None
-            return node
-
-        current_root = self._root
-        while current_root is not None:
-            if current_root.val <= x:
-                right_subtree = current_root.right
-                left_subtree = current_root.left
-
-                # deleting current_root from subtree, deleting all links
-                current_root = _detach(current_root)
-
-                # left_subtree is AVL
-                # adding current_root after max of left_subtree
-                left_subtree_max_node = self._get_max(left_subtree)
-
-                if left_subtree_max_node:
-                    left_subtree_max_node.right = current_root
-                    left_subtree_max_node.right.parent = left_subtree_max_node
-                    left_subtree_max_node = self._balance_up(left_subtree_max_node)
-                else:
-                    left_subtree_max_node = current_root
-
-                # merging t1 and built tree
-                if t1._root is None:
-                    t1._root = left_subtree_max_node
-                else:
-                    #finds subtree p in t1: p.height <= left_subtree_max_node.height
-                    p = t1._root
-                    while p.right and self._height(p) > self._height(left_subtree_max_node):
-                        p = p.right
-                    p_parent = p.parent
-
-                    # removing parentness for merge to not fuck up
-                    if p.parent:
-                        p.parent.right = None
-                    p.parent = None
-
-                    k = self._merge(left_subtree_max_node, p)
-
-                    # attaching merged tree
-                    if p_parent:
-                        p_parent.right = k
-                        k.parent = p_parent
-                        p_parent = self._balance_up(p_parent)
-                        if p_parent.parent is None:
-                            t1._root = p_parent
-                    else:
-                        t1._root = k
-                current_root = right_subtree # goes deeper
-
-            else: # current_root.val > x
-                right_subtree = current_root.right
-                left_subtree = current_root.left
-
-                # deleting current_root from subtree, deleting all links
-                current_root = _detach(current_root)
-
-                # right_subtree is AVL
-                # adding current_root after min of right_subtree
-                right_subtree_min_node = self._get_min(right_subtree)
-
-                if right_subtree_min_node:
-                    right_subtree_min_node.left = current_root
-                    right_subtree_min_node.left.parent = right_subtree_min_node
-                    right_subtree_min_node = self._balance_up(right_subtree_min_node)
-                else:
-                    right_subtree_min_node = current_root
-
-                # merging t2 and built tree
-                if t2._root is None:
-                    t2._root = right_subtree_min_node
-                else:
-                    # finds subtree p in t2: p.height <= right_subtree_min_node.height
-                    p = t2._root
-                    while p.left and self._height(p) > self._height(right_subtree_min_node):
-                        p = p.left
-                    p_parent = p.parent
-
-                    # removing parentness for merge to not fuck up
-                    if p.parent:
-                        p.parent.left = None
-                    p.parent = None
-                    k = self._merge(p, right_subtree_min_node)
-
-                    # attaching merged tree
-                    if p_parent:
-                        p_parent.left = k
-                        k.parent = p_parent
-                        p_parent = self._balance_up(p_parent)
-                        if p_parent.parent is None:
-                            t2._root = p_parent
-                    else:
-                        t2._root = k
-                current_root = left_subtree  # goes deeper
-        t1._root = t1._balance(t1._root)
-        t2._root = t2._balance(t2._root)
+        t1._root, t2._root = self._split(self._root, x)
         return t1, t2
 
     def breadth_first_search(self) -> list[list[Any | None]]: